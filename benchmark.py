@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+# coding: utf-8
+# Copyright 2026 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+import contextlib
+import json
+import pathlib
+import sqlite3
+import sys
+import tempfile
+
+import helpers
+import profiling
+import stockdice
+import synthetic_universe
+
+
+BASELINE_PATH = helpers.DIR / "benchmark_baseline.json"
+SIZES = (10_000, 100_000)
+# The stages of stockdice.main, then its output stage split in two. "sample"
+# materializes every roll so that "write" can be timed on its own.
+STAGES = stockdice.STAGES + ("sample", "write")
+
+# Allow this much slowdown (or memory growth) relative to the baseline before
+# reporting a regression. Timings on a shared machine are noisy.
+TOLERANCE = 0.2
+
+
+def universe_paths(directory, size, seed=0):
+    """Generate a universe of the given size, reusing a previous one if present."""
+    directory = pathlib.Path(directory) / str(size)
+    paths = (
+        directory / "allsymbols.txt",
+        directory / "forex.csv",
+        directory / "stockdice.sqlite",
+    )
+    if all(path.exists() for path in paths):
+        return paths
+    return synthetic_universe.generate(directory, size, seed=seed)
+
+
+def run_stages(paths, number_of_rolls, format, output_path, trace_memory=False):
+    symbols_path, forex_path, db_path = paths
+    profiler = profiling.StageProfiler(trace_memory=trace_memory)
+    hooks = [profiler]
+
+    # Conversion uses the module-level forex table, so put back whatever was
+    # loaded before stockdice.main swaps in the synthetic rates.
+    previous_forex = helpers.forex_to_usd
+    db = sqlite3.connect(db_path)
+    try:
+        screen = stockdice.main(
+            number_of_rolls=number_of_rolls,
+            output_path=output_path,
+            format=format,
+            hooks=hooks,
+            db=db,
+            symbols_path=symbols_path,
+            forex_path=forex_path,
+        )
+
+        # Split the output stage to see whether sampling or writing dominates.
+        with stockdice.run_stage("sample", hooks) as stats:
+            chunks = list(stockdice.sample_chunks(screen, number_of_rolls))
+            stats["rows"] = number_of_rolls
+        with stockdice.run_stage("write", hooks) as stats:
+            stockdice.output_chunks(chunks, output_path, format, screen=screen)
+            stats["rows"] = number_of_rolls
+    finally:
+        profiler.close()
+        db.close()
+        helpers.forex_to_usd = previous_forex
+    return {record["stage"]: record for record in profiler.stages}
+
+
+def benchmark(paths, number_of_rolls, format, output_path, repeat):
+    """Time each stage, keeping the fastest of several runs.
+
+    Memory is measured in a separate run, since tracing allocations slows
+    everything down.
+    """
+    results = {}
+    for _ in range(repeat):
+        run = run_stages(paths, number_of_rolls, format, output_path)
+        for name, record in run.items():
+            seconds = results.get(name, {}).get("seconds", record["wall_seconds"])
+            results[name] = {"seconds": min(seconds, record["wall_seconds"])}
+
+    traced = run_stages(paths, number_of_rolls, format, output_path, trace_memory=True)
+    for name, record in traced.items():
+        results[name]["peak_bytes"] = record["memory_peak_bytes"]
+    return results
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """Print a report and return the list of regressed (size, stage, metric)."""
+    regressions = []
+    for size, stages in results.items():
+        for name in STAGES:
+            stats = stages[name]
+            line = (
+                f"{size:>9} {name:<8} {stats['seconds']:10.4f}s "
+                f"{stats['peak_bytes'] / 2 ** 20:10.1f}MiB"
+            )
+            previous = baseline.get(size, {}).get(name)
+            if previous is not None:
+                for metric in ("seconds", "peak_bytes"):
+                    if not previous.get(metric):
+                        continue
+                    ratio = stats[metric] / previous[metric]
+                    line += f" {metric}={ratio:.2f}x"
+                    if ratio > 1 + tolerance:
+                        regressions.append((size, name, metric))
+                        line += "!"
+            print(line)
+    return regressions
+
+
+def main(
+    sizes=SIZES,
+    number_of_rolls=10_000,
+    format="csv",
+    repeat=3,
+    scratch=None,
+    baseline_path=BASELINE_PATH,
+    save_baseline=False,
+    tolerance=TOLERANCE,
+):
+    with contextlib.ExitStack() as stack:
+        if scratch is None:
+            scratch = stack.enter_context(tempfile.TemporaryDirectory())
+        scratch = pathlib.Path(scratch)
+
+        results = {}
+        for size in sizes:
+            paths = universe_paths(scratch, size)
+            output_path = paths[0].parent / f"rolls.{format}"
+            results[str(size)] = benchmark(
+                paths, number_of_rolls, format, output_path, repeat
+            )
+
+    baseline = {}
+    if baseline_path.exists():
+        with open(baseline_path) as baseline_file:
+            baseline = json.load(baseline_file)
+    regressions = compare(results, baseline, tolerance=tolerance)
+
+    if save_baseline:
+        baseline.update(results)
+        with open(baseline_path, "w") as baseline_file:
+            json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="benchmark.py")
+    parser.add_argument("-s", "--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("-n", "--number", type=int, default=10_000)
+    parser.add_argument("-f", "--format", default="csv", choices=stockdice.OUTPUT_WRITERS)
+    parser.add_argument("-r", "--repeat", type=int, default=3)
+    parser.add_argument("--scratch", help="reuse generated universes in this directory")
+    parser.add_argument("--baseline", type=pathlib.Path, default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    args = parser.parse_args()
+    regressions = main(
+        sizes=args.sizes,
+        number_of_rolls=args.number,
+        format=args.format,
+        repeat=args.repeat,
+        scratch=args.scratch,
+        baseline_path=args.baseline,
+        save_baseline=args.save_baseline,
+        tolerance=args.tolerance,
+    )
+    if regressions:
+        sys.exit(f"{len(regressions)} regressions relative to {args.baseline}")
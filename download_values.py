@@ -16,14 +16,18 @@
 
 import argparse
 import asyncio
+import contextlib
 import datetime
 import logging
 import time
 import sys
 
 import aiohttp
+import pandas
+import requests
 
 from helpers import *
+import initialize_db
 
 from typing import Optional
 
@@ -32,9 +36,82 @@ FMP_QUOTE = "https://financialmodelingprep.com/api/v3/quote/{symbol}?apikey={api
 FMP_INCOME_STATEMENT = "https://financialmodelingprep.com/api/v3/income-statement/{symbol}?limit=1&apikey={apikey}"
 FMP_BALANCE_SHEET = "https://financialmodelingprep.com/api/v3/balance-sheet-statement/{symbol}?period=quarter&limit=1&apikey={apikey}"
 
+FMP_INCOME_STATEMENT_BULK = "https://financialmodelingprep.com/api/v4/income-statement-bulk?year={year}&period={period}&apikey={apikey}"
+FMP_BALANCE_SHEET_BULK = "https://financialmodelingprep.com/api/v4/balance-sheet-statement-bulk?year={year}&period={period}&apikey={apikey}"
+
 BATCH_SIZE = 10
 BATCH_WAIT = 1
 
+UPSERT_INCOME = """INSERT INTO incomes
+(symbol, profit, revenue, currency, statement_date, last_updated_us)
+VALUES (:symbol, :profit, :revenue, :currency, :statement_date, :last_updated_us)
+ON CONFLICT(symbol) DO UPDATE
+SET profit=excluded.profit,
+  revenue=excluded.revenue,
+  currency=excluded.currency,
+  statement_date=excluded.statement_date,
+  last_updated_us=excluded.last_updated_us
+"""
+UPSERT_BALANCE_SHEET = """INSERT INTO balance_sheets
+(symbol, book, currency, statement_date, last_updated_us)
+VALUES (:symbol, :book, :currency, :statement_date, :last_updated_us)
+ON CONFLICT(symbol) DO UPDATE
+SET book=excluded.book,
+  currency=excluded.currency,
+  statement_date=excluded.statement_date,
+  last_updated_us=excluded.last_updated_us
+"""
+# Upsert every row of a bulk file at once, from the bulk_rows temporary table.
+# A bulk file may be older than what was already downloaded per symbol. Only
+# replace a row with a newer statement or, for rows from before statement
+# dates were recorded, a row that is due for a refresh. "WHERE true" keeps
+# SQLite from parsing ON CONFLICT as part of the SELECT.
+BULK_UPSERT = """INSERT INTO {table}
+({columns}, last_updated_us)
+SELECT {columns}, :last_updated_us FROM bulk_rows WHERE true
+ON CONFLICT(symbol) DO UPDATE
+SET {updates},
+  last_updated_us=excluded.last_updated_us
+WHERE excluded.statement_date > {table}.statement_date
+  OR ({table}.statement_date IS NULL
+    AND COALESCE({table}.last_updated_us, 0) <= :max_last_updated_us)
+"""
+
+# Bulk CSVs have every company's statements for a fiscal year. Map their
+# columns to ours, using the same periods as the per-symbol endpoints. By
+# default, download last year's annual incomes, since the current year's
+# aren't complete, and the current year's quarterly balance sheets.
+BULK_ENDPOINTS = {
+    "incomes": {
+        "url": FMP_INCOME_STATEMENT_BULK,
+        "period": "annual",
+        "columns": {
+            "grossProfit": "profit",
+            "revenue": "revenue",
+            "reportedCurrency": "currency",
+        },
+        # Same rules as the per-symbol downloads for recording empty lookups.
+        "required": ["profit", "revenue"],
+        "years_ago": 1,
+    },
+    "balance_sheets": {
+        "url": FMP_BALANCE_SHEET_BULK,
+        "period": "quarter",
+        "columns": {
+            "totalStockholdersEquity": "book",
+            "reportedCurrency": "currency",
+        },
+        "required": ["book"],
+        "years_ago": 0,
+    },
+}
+BULK_CHUNK_SIZE = 100_000
+
+# Warrants, units, preferred shares, and the like never have statements.
+# Wait exponentially longer to re-check a symbol each time it comes back empty.
+EMPTY_RECHECK_BASE = datetime.timedelta(days=1)
+EMPTY_RECHECK_MAX = datetime.timedelta(days=64)
+
 
 def load_symbols():
     all_symbols = []
@@ -59,6 +136,79 @@ def is_fresh(table: str, symbol: str, max_last_updated_us: int) -> bool:
     )
 
 
+def is_known_empty(table: str, symbol: str, now_us: int) -> bool:
+    cursor = DB.execute(
+        """SELECT next_check_us FROM empty_lookups
+        WHERE endpoint = :endpoint AND symbol = :symbol
+        """,
+        {"endpoint": table, "symbol": symbol},
+    )
+    next_check = cursor.fetchone()
+    return next_check is not None and next_check[0] > now_us
+
+
+def record_lookup(table: str, symbol: str, is_empty: bool, last_updated_us: int):
+    """Update the negative cache with the result of a lookup.
+
+    Callers are responsible for committing.
+    """
+    if not is_empty:
+        DB.execute(
+            "DELETE FROM empty_lookups WHERE endpoint = :endpoint AND symbol = :symbol",
+            {"endpoint": table, "symbol": symbol},
+        )
+        return
+
+    cursor = DB.execute(
+        """SELECT empty_count FROM empty_lookups
+        WHERE endpoint = :endpoint AND symbol = :symbol
+        """,
+        {"endpoint": table, "symbol": symbol},
+    )
+    previous = cursor.fetchone()
+    empty_count = 1 if previous is None else previous[0] + 1
+    recheck = min(EMPTY_RECHECK_MAX, EMPTY_RECHECK_BASE * 2 ** (empty_count - 1))
+    DB.execute(
+        """INSERT INTO empty_lookups
+        (symbol, endpoint, empty_count, last_checked_us, next_check_us)
+        VALUES (:symbol, :endpoint, :empty_count, :last_checked_us, :next_check_us)
+        ON CONFLICT(symbol, endpoint) DO UPDATE
+        SET empty_count=excluded.empty_count,
+          last_checked_us=excluded.last_checked_us,
+          next_check_us=excluded.next_check_us
+        """,
+        {
+            "symbol": symbol,
+            "endpoint": table,
+            "empty_count": empty_count,
+            "last_checked_us": last_updated_us,
+            "next_check_us": last_updated_us + recheck / datetime.timedelta(microseconds=1),
+        },
+    )
+
+
+def report_empty(table: str, out=None):
+    """Write the symbols in the negative cache for table as CSV."""
+    if out is None:
+        out = sys.stdout
+    epoch = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+    cursor = DB.execute(
+        """SELECT symbol, empty_count, last_checked_us, next_check_us
+        FROM empty_lookups
+        WHERE endpoint = :endpoint
+        ORDER BY next_check_us ASC, symbol ASC
+        """,
+        {"endpoint": table},
+    )
+    out.write("symbol,empty_count,last_checked,next_check\n")
+    for symbol, empty_count, last_checked_us, next_check_us in cursor:
+        last_checked = epoch + datetime.timedelta(microseconds=last_checked_us)
+        next_check = epoch + datetime.timedelta(microseconds=next_check_us)
+        out.write(
+            f"{symbol},{empty_count},{last_checked.isoformat()},{next_check.isoformat()}\n"
+        )
+
+
 @retry_fmp
 async def download_income(
     session, symbol: str, last_updated_us: int
@@ -74,10 +224,13 @@ async def download_income(
         profit = None
         revenue = None
         currency = None
+        statement_date = None
         if resp_json:
+            statement_date = resp_json[0].get("date")
             profit = resp_json[0].get("grossProfit")
             revenue = resp_json[0].get("revenue")
             currency = resp_json[0].get("reportedCurrency")
+        record_lookup("incomes", symbol, revenue is None and profit is None, last_updated_us)
         if revenue is None:
             logging.warning(f"no revenue for {symbol}")
             revenue = 0
@@ -86,20 +239,13 @@ async def download_income(
             profit = 0
 
         DB.execute(
-            """INSERT INTO incomes
-            (symbol, profit, revenue, currency, last_updated_us)
-            VALUES (:symbol, :profit, :revenue, :currency, :last_updated_us)
-            ON CONFLICT(symbol) DO UPDATE
-            SET profit=excluded.profit,
-              revenue=excluded.revenue,
-              currency=excluded.currency,
-              last_updated_us=excluded.last_updated_us
-            """,
+            UPSERT_INCOME,
             {
                 "symbol": symbol,
                 "profit": float(profit),
                 "revenue": float(revenue),
                 "currency": currency,
+                "statement_date": statement_date,
                 "last_updated_us": last_updated_us,
             },
         )
@@ -120,26 +266,23 @@ async def download_balance_sheet(session, symbol: str, last_updated_us: int):
         resp_json = await check_status(resp)
         book_value = None
         currency = None
+        statement_date = None
         if resp_json:
+            statement_date = resp_json[0].get("date")
             book_value = resp_json[0].get("totalStockholdersEquity")
             currency = resp_json[0].get("reportedCurrency")
+        record_lookup("balance_sheets", symbol, book_value is None, last_updated_us)
         if book_value is None:
             logging.warning(f"no book value for {symbol}")
             book_value = 0
 
         DB.execute(
-            """INSERT INTO balance_sheets 
-            (symbol, book, currency, last_updated_us)
-            VALUES (:symbol, :book, :currency, :last_updated_us)
-            ON CONFLICT(symbol) DO UPDATE
-            SET book=excluded.book,
-              currency=excluded.currency,
-              last_updated_us=excluded.last_updated_us
-            """,
+            UPSERT_BALANCE_SHEET,
             {
                 "symbol": symbol,
                 "book": float(book_value),
                 "currency": currency,
+                "statement_date": statement_date,
                 "last_updated_us": last_updated_us,
             },
         )
@@ -154,6 +297,7 @@ async def download_market_cap(session, symbol: str, last_updated_us: int):
         market_cap = None
         if resp_json:
             market_cap = resp_json[0].get("marketCap")
+        record_lookup("quotes", symbol, market_cap is None, last_updated_us)
         if market_cap is None:
             logging.warning(f"no market cap for {symbol}")
             market_cap = 0
@@ -175,6 +319,146 @@ async def download_market_cap(session, symbol: str, last_updated_us: int):
         DB.commit()
 
 
+@contextlib.contextmanager
+def open_bulk_source(source):
+    """Open a bulk CSV from a local path or an http(s) URL as a binary stream."""
+    source = str(source)
+    if source.startswith(("http://", "https://")):
+        with requests.get(source, stream=True) as resp:
+            resp.raise_for_status()
+            resp.raw.decode_content = True
+            yield resp.raw
+    else:
+        with open(source, "rb") as handle:
+            yield handle
+
+
+def latest_bulk_rows(handle, columns, symbols, chunk_size=BULK_CHUNK_SIZE):
+    """Parse a bulk CSV in chunks, keeping only the latest period per symbol.
+
+    Only the latest rows are kept in memory, so this is bounded by the number
+    of symbols, not the size of the file.
+    """
+    latest = pandas.DataFrame(columns=["symbol", "date", *columns])
+    chunks = pandas.read_csv(
+        handle,
+        usecols=["symbol", "date", *columns],
+        chunksize=chunk_size,
+        dtype={"symbol": object, "date": object, "reportedCurrency": object},
+        # "NA" and friends are real ticker symbols.
+        keep_default_na=False,
+        na_values=[""],
+    )
+    with chunks:
+        for chunk in chunks:
+            chunk = chunk[chunk["symbol"].isin(symbols)]
+            if len(latest.index):
+                chunk = pandas.concat([latest, chunk], ignore_index=True)
+            # Stable sort so that, for the same date, later rows win.
+            latest = chunk.sort_values("date", kind="stable").drop_duplicates(
+                "symbol", keep="last"
+            )
+    return latest.rename(columns={"date": "statement_date", **columns})
+
+
+def ingest_bulk(
+    table: str,
+    source,
+    symbols=None,
+    chunk_size=BULK_CHUNK_SIZE,
+    max_age: datetime.timedelta = datetime.timedelta(days=1),
+) -> int:
+    """Upsert the latest statement per listed symbol from a bulk CSV.
+
+    Rows with a newer statement, or without a statement date that were
+    updated within max_age, are kept.
+
+    Returns the number of symbols updated.
+    """
+    endpoint = BULK_ENDPOINTS[table]
+    if symbols is None:
+        symbols = load_symbols()
+    epoch = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    last_updated_us = (now - epoch) / datetime.timedelta(microseconds=1)
+    max_last_updated_us = ((now - max_age) - epoch) / datetime.timedelta(microseconds=1)
+
+    with open_bulk_source(source) as handle:
+        latest = latest_bulk_rows(
+            handle, endpoint["columns"], set(symbols), chunk_size=chunk_size
+        )
+
+    # Empty if all of the required values are missing.
+    latest["is_empty"] = latest[endpoint["required"]].isna().all(axis="columns")
+    values = [
+        column for column in endpoint["columns"].values() if column != "currency"
+    ]
+    # Match the per-symbol downloads, which write 0 for missing values.
+    latest[values] = latest[values].fillna(0).astype(float)
+    for column in ("currency", "statement_date"):
+        latest[column] = latest[column].astype(object).where(
+            latest[column].notna(), None
+        )
+
+    columns = ["symbol", *endpoint["columns"].values(), "statement_date"]
+    params = {
+        "endpoint": table,
+        "last_updated_us": last_updated_us,
+        "max_last_updated_us": max_last_updated_us,
+        "recheck_base_us": EMPTY_RECHECK_BASE / datetime.timedelta(microseconds=1),
+        "recheck_max_us": EMPTY_RECHECK_MAX / datetime.timedelta(microseconds=1),
+    }
+    with initialize_db.bulk_load_pragmas(DB):
+        DB.execute("DROP TABLE IF EXISTS temp.bulk_rows")
+        DB.execute(f"CREATE TEMP TABLE bulk_rows({', '.join(columns)}, is_empty INTEGER)")
+        DB.executemany(
+            f"INSERT INTO bulk_rows VALUES ({', '.join('?' for _ in columns)}, ?)",
+            latest[[*columns, "is_empty"]].itertuples(index=False, name=None),
+        )
+        DB.execute(
+            BULK_UPSERT.format(
+                table=table,
+                columns=", ".join(columns),
+                updates=", ".join(
+                    f"{column}=excluded.{column}" for column in columns[1:]
+                ),
+            ),
+            params,
+        )
+        # Rows the upsert skipped kept their older last_updated_us.
+        updated = f"""SELECT symbol FROM bulk_rows JOIN {table} USING (symbol)
+        WHERE {table}.last_updated_us = :last_updated_us
+        """
+        DB.execute(
+            f"""DELETE FROM empty_lookups
+            WHERE endpoint = :endpoint
+              AND symbol IN ({updated} AND NOT bulk_rows.is_empty)
+            """,
+            params,
+        )
+        # Same backoff as record_lookup.
+        DB.execute(
+            f"""INSERT INTO empty_lookups
+            (symbol, endpoint, empty_count, last_checked_us, next_check_us)
+            SELECT symbol, :endpoint, 1, :last_updated_us,
+              :last_updated_us + :recheck_base_us
+            FROM ({updated} AND bulk_rows.is_empty)
+            WHERE true
+            ON CONFLICT(symbol, endpoint) DO UPDATE
+            SET empty_count=empty_lookups.empty_count + 1,
+              last_checked_us=excluded.last_checked_us,
+              next_check_us=excluded.last_checked_us + MIN(
+                :recheck_max_us,
+                :recheck_base_us * (1 << MIN(empty_lookups.empty_count, 32))
+              )
+            """,
+            params,
+        )
+        (count,) = DB.execute(f"SELECT COUNT(*) FROM ({updated})", params).fetchone()
+        DB.execute("DROP TABLE temp.bulk_rows")
+    return count
+
+
 async def main(download_fn, table: str, max_age: datetime.timedelta = datetime.timedelta(days=1)):
     all_symbols = load_symbols()
 
@@ -187,9 +471,13 @@ async def main(download_fn, table: str, max_age: datetime.timedelta = datetime.t
     async with aiohttp.ClientSession() as session:
         batch_index = 0
         batch_start = time.monotonic()
+        skipped_empty = 0
         for symbol in all_symbols:
             if is_fresh(table, symbol, max_last_updated_us):
                 continue
+            if is_known_empty(table, symbol, last_updated_us):
+                skipped_empty += 1
+                continue
 
             # Rate limit!
             if batch_index >= BATCH_SIZE:
@@ -201,10 +489,38 @@ async def main(download_fn, table: str, max_age: datetime.timedelta = datetime.t
                 batch_index = 0
             await download_fn(session, symbol, last_updated_us)
 
+    if skipped_empty:
+        print(
+            f"skipped {skipped_empty} symbols with no data in {table}, "
+            "see --report-empty"
+        )
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--max-age", default="1d")
+    parser.add_argument(
+        "--report-empty",
+        action="store_true",
+        help="list symbols skipped because previous lookups returned no data",
+    )
+    parser.add_argument(
+        "--bulk",
+        action="store_true",
+        help="load statements for all companies from an FMP bulk CSV",
+    )
+    parser.add_argument(
+        "--bulk-source",
+        help="path or URL of the bulk CSV (default: download from FMP)",
+    )
+    parser.add_argument(
+        "--year",
+        type=int,
+        help=(
+            "fiscal year to download in bulk (default: last year for incomes,"
+            " this year for balance sheets)"
+        ),
+    )
     parser.add_argument("command")
     args = parser.parse_args()
     command = args.command
@@ -219,7 +535,27 @@ if __name__ == "__main__":
         download_fn = download_income
     else:
         sys.exit("expected {quote,balance-sheet,income}")
-    
+
+    initialize_db.migrate()
+    if args.report_empty:
+        report_empty(table)
+        sys.exit()
+    if args.bulk:
+        if table not in BULK_ENDPOINTS:
+            sys.exit("expected {balance-sheet,income} for bulk downloads")
+        endpoint = BULK_ENDPOINTS[table]
+        source = args.bulk_source
+        if source is None:
+            year = args.year
+            if year is None:
+                year = datetime.date.today().year - endpoint["years_ago"]
+            source = endpoint["url"].format(
+                year=year, period=endpoint["period"], apikey=FMP_API_KEY
+            )
+        rows = ingest_bulk(table, source, max_age=parse_timedelta(args.max_age))
+        print(f"updated {rows} symbols in {table}")
+        sys.exit()
+
     max_age = parse_timedelta(args.max_age)
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
@@ -100,10 +100,11 @@ def parse_timedelta(value: str) -> datetime.timedelta:
     return datetime.timedelta(**kwargs)
 
 
-def load_forex():
+def load_forex(csv_path=None):
     global forex_to_usd
     forex_to_usd = {"USD": 1.0}
-    csv_path = FMP_DIR / "forex.csv"
+    if csv_path is None:
+        csv_path = FMP_DIR / "forex.csv"
 
     with open(csv_path) as forex_csv:
         for line in forex_csv:
@@ -15,6 +15,8 @@
 # limitations under the License.
 
 import argparse
+import contextlib
+import pathlib
 import sys
 
 import pandas
@@ -22,68 +24,219 @@ import pandas
 from helpers import *
 
 
-def create_quote():
-    DB.execute("DROP TABLE IF EXISTS quotes;")
-    DB.execute("""
-    CREATE TABLE quotes(
-    symbol STRING PRIMARY KEY,
-    market_cap_usd REAL,
-    last_updated_us INTEGER
-    );
-    """)
+# Each migration is a list of statements, applied in a single transaction
+# along with the bump to PRAGMA user_version. Only ever append to this list.
+MIGRATIONS = (
+    # 1: Initial tables. IF NOT EXISTS keeps the data in databases created
+    # before migrations were versioned.
+    (
+        """
+        CREATE TABLE IF NOT EXISTS quotes(
+        symbol STRING PRIMARY KEY,
+        market_cap_usd REAL,
+        last_updated_us INTEGER
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS balance_sheets(
+        symbol STRING PRIMARY KEY,
+        book REAL,
+        currency STRING,
+        last_updated_us INTEGER
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS incomes(
+        symbol STRING PRIMARY KEY,
+        profit REAL,
+        revenue REAL,
+        currency STRING,
+        last_updated_us INTEGER
+        );
+        """,
+    ),
+    # 2: Refreshes look for rows older than the max age.
+    (
+        "CREATE INDEX IF NOT EXISTS quotes_last_updated_us ON quotes(last_updated_us);",
+        "CREATE INDEX IF NOT EXISTS balance_sheets_last_updated_us ON balance_sheets(last_updated_us);",
+        "CREATE INDEX IF NOT EXISTS incomes_last_updated_us ON incomes(last_updated_us);",
+    ),
+    # 3: Checkpoints so that an interrupted import can resume.
+    (
+        """
+        CREATE TABLE IF NOT EXISTS import_progress(
+        source STRING PRIMARY KEY,
+        rows INTEGER
+        );
+        """,
+    ),
+    # 4: Negative cache of symbols for which FMP keeps returning no data.
+    (
+        """
+        CREATE TABLE IF NOT EXISTS empty_lookups(
+        symbol STRING,
+        endpoint STRING,
+        empty_count INTEGER,
+        last_checked_us INTEGER,
+        next_check_us INTEGER,
+        PRIMARY KEY (symbol, endpoint)
+        );
+        """,
+    ),
+    # 5: Date of the statement the values came from, so that a bulk import
+    # doesn't replace a newer statement with an older one.
+    (
+        "ALTER TABLE incomes ADD COLUMN statement_date STRING;",
+        "ALTER TABLE balance_sheets ADD COLUMN statement_date STRING;",
+    ),
+)
 
+# Columns in the legacy CSV files, which have no header row.
+LEGACY_COLUMNS = {
+    "quotes": ("symbol", "market_cap_usd"),
+    "balance_sheets": ("symbol", "book", "currency"),
+    "incomes": ("symbol", "profit", "revenue", "currency"),
+}
+TEXT_COLUMNS = {"symbol", "currency"}
 
-def load_quote(quote_path):
-    quote = pandas.read_csv(quote_path, header=None, names=["symbol", "market_cap_usd"], index_col="symbol")
-    quote = quote.groupby(quote.index).last()
-    quote.to_sql("quotes", DB, if_exists="append")
+# Rows per import transaction. Big enough that most imports commit once, but
+# a multi-million-row history checkpoints its progress along the way.
+BATCH_SIZE = 500_000
+# Negative values are in KiB.
+BULK_CACHE_SIZE = -256 * 1024
 
 
-def create_balance_sheet():
-    DB.execute("DROP TABLE IF EXISTS balance_sheets;")
-    DB.execute("""
-    CREATE TABLE balance_sheets(
-    symbol STRING PRIMARY KEY,
-    book REAL,
-    currency STRING,
-    last_updated_us INTEGER
-    );
-    """)
+def schema_version(db=DB) -> int:
+    (version,) = db.execute("PRAGMA user_version").fetchone()
+    return version
 
 
-def load_balance_sheet(balance_sheet_path):
-    balance_sheet = pandas.read_csv(
-        balance_sheet_path,
-        header=None,
-        names=["symbol", "book", "currency"],
-        index_col="symbol",
+def migrate(db=DB) -> int:
+    """Apply any pending migrations, keeping existing data."""
+    version = schema_version(db)
+    db.commit()
+    for version, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+        db.execute("BEGIN")
+        try:
+            for statement in statements:
+                db.execute(statement)
+            db.execute(f"PRAGMA user_version = {version}")
+        except:
+            db.rollback()
+            raise
+        db.commit()
+    return version
+
+
+@contextlib.contextmanager
+def bulk_load_pragmas(db=DB):
+    """Trade durability on power loss for speed while importing.
+
+    A crash of this process can't corrupt the database with synchronous=OFF,
+    only an OS crash can, and an import can be re-run anyway. The pending
+    transaction is committed on exit, or rolled back on an error, so that the
+    settings can be restored.
+    """
+    # Pragmas can't be changed within a transaction.
+    db.commit()
+    (synchronous,) = db.execute("PRAGMA synchronous").fetchone()
+    (cache_size,) = db.execute("PRAGMA cache_size").fetchone()
+    (temp_store,) = db.execute("PRAGMA temp_store").fetchone()
+    db.execute("PRAGMA synchronous = OFF")
+    db.execute(f"PRAGMA cache_size = {BULK_CACHE_SIZE}")
+    db.execute("PRAGMA temp_store = MEMORY")
+    try:
+        yield
+        db.commit()
+    except:
+        db.rollback()
+        raise
+    finally:
+        db.execute(f"PRAGMA synchronous = {synchronous}")
+        db.execute(f"PRAGMA cache_size = {cache_size}")
+        db.execute(f"PRAGMA temp_store = {temp_store}")
+
+
+def import_source(table, csv_path) -> str:
+    """Key for the progress of importing csv_path into table.
+
+    Includes the file's size and modification time, so that replacing the
+    file after an interrupted import starts over instead of skipping rows.
+    """
+    path = pathlib.Path(csv_path).resolve()
+    stat = path.stat()
+    return f"{table}:{path}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def load_legacy_csv(table, csv_path, db=DB, batch_size=BATCH_SIZE) -> int:
+    """Upsert a legacy CSV into table, returning the number of rows read.
+
+    Later rows for a symbol replace earlier ones. Rows already refreshed by
+    download_values.py (with a last_updated_us) are left alone.
+    """
+    columns = LEGACY_COLUMNS[table]
+    updates = ", ".join(f"{column}=excluded.{column}" for column in columns[1:])
+    upsert = f"""INSERT INTO {table}
+    ({", ".join(columns)})
+    VALUES ({", ".join("?" for _ in columns)})
+    ON CONFLICT(symbol) DO UPDATE
+    SET {updates}
+    WHERE {table}.last_updated_us IS NULL
+    """
+    source = import_source(table, csv_path)
+    # Forget progress from earlier versions of the same file.
+    prefix = f"{table}:{pathlib.Path(csv_path).resolve()}:"
+    db.execute(
+        """DELETE FROM import_progress
+        WHERE substr(source, 1, length(:prefix)) = :prefix AND source != :source
+        """,
+        {"prefix": prefix, "source": source},
     )
-    balance_sheet = balance_sheet.groupby(balance_sheet.index).last()
-    balance_sheet.to_sql("balance_sheets", DB, if_exists="append")
-
-
-def create_income():
-    DB.execute("DROP TABLE IF EXISTS incomes;")
-    DB.execute("""
-    CREATE TABLE incomes(
-    symbol STRING PRIMARY KEY,
-    profit REAL,
-    revenue REAL,
-    currency STRING,
-    last_updated_us INTEGER
-    );
-    """)
-
-
-def load_income(income_path):
-    income = pandas.read_csv(
-        income_path,
+    db.commit()
+    progress = db.execute(
+        "SELECT rows FROM import_progress WHERE source = ?", (source,)
+    ).fetchone()
+    done = 0 if progress is None else progress[0]
+
+    chunks = pandas.read_csv(
+        csv_path,
         header=None,
-        names=["symbol", "profit", "revenue", "currency"],
-        index_col="symbol",
+        names=columns,
+        skiprows=done,
+        chunksize=batch_size,
+        dtype={column: object for column in TEXT_COLUMNS & set(columns)},
+        # "NA" and friends are real ticker symbols.
+        keep_default_na=False,
+        na_values=[""],
     )
-    income = income.groupby(income.index).last()
-    income.to_sql("incomes", DB, if_exists="append")
+    with chunks, bulk_load_pragmas(db):
+        for chunk in chunks:
+            db.execute("BEGIN")
+            try:
+                # SQLite stores NaN as NULL.
+                db.executemany(upsert, chunk.itertuples(index=False, name=None))
+                db.execute(
+                    """INSERT INTO import_progress (source, rows) VALUES (?, ?)
+                    ON CONFLICT(source) DO UPDATE SET rows=excluded.rows
+                    """,
+                    (source, done + len(chunk.index)),
+                )
+            except:
+                db.rollback()
+                raise
+            db.commit()
+            done += len(chunk.index)
+
+        db.execute("DELETE FROM import_progress WHERE source = ?", (source,))
+        db.commit()
+    return done
+
+
+LEGACY_CSVS = {
+    "quote": ("quotes", "quote.csv"),
+    "balance-sheet": ("balance_sheets", "balance-sheet-statement.csv"),
+    "income": ("incomes", "income-statement.csv"),
+}
 
 
 if __name__ == "__main__":
@@ -91,33 +244,17 @@ if __name__ == "__main__":
     parser.add_argument("command")
     args = parser.parse_args()
     command = args.command
-    if command == "quote":
-        csv_path = FMP_DIR / "quote.csv"
-        create_quote()
+    if command in LEGACY_CSVS:
+        table, csv_name = LEGACY_CSVS[command]
+        migrate()
         try:
-            load_quote(csv_path)
-        except FileNotFoundError:
-            print("no CSV to migrate, finished")
-    elif command == "balance-sheet":
-        csv_path = FMP_DIR / "balance-sheet-statement.csv"
-        create_balance_sheet()
-        try:
-            load_balance_sheet(csv_path)
-        except FileNotFoundError:
-            print("no CSV to migrate, finished")
-    elif command == "income":
-        csv_path = FMP_DIR / "income-statement.csv"
-        create_income()
-        try:
-            load_income(csv_path)
+            rows = load_legacy_csv(table, FMP_DIR / csv_name)
         except FileNotFoundError:
             print("no CSV to migrate, finished")
+        else:
+            print(f"migrated {rows} rows into {table}")
     elif command == "all":
-        create_quote()
-        create_balance_sheet()
-        create_income()
-        print("database initialized")
+        version = migrate()
+        print(f"database initialized at schema version {version}")
     else:
-        sys.exit("expected {quote,balance-sheet,income}")
-    
-
+        sys.exit("expected {all,quote,balance-sheet,income}")
@@ -0,0 +1,101 @@
+# coding: utf-8
+# Copyright 2026 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import cProfile
+import contextlib
+import json
+import sys
+import time
+import tracemalloc
+
+
+class StageProfiler:
+    """Stage hook recording wall time, CPU time, row counts, and memory.
+
+    Pass an instance in the ``hooks`` argument of ``stockdice.main``. Memory
+    is measured with tracemalloc when trace_memory is set. Tracing slows
+    allocation-heavy stages down by very different amounts, so the times
+    aren't recorded in that case. Profile memory and time in separate runs.
+
+    Memory is traced continuously from when the profiler is created, so that
+    a stage which frees memory allocated earlier has a negative delta. Call
+    close() to stop tracing.
+    """
+
+    def __init__(self, trace_memory=False, cprofile_stage=None, cprofile_path=None):
+        self.trace_memory = trace_memory
+        self.cprofile_stage = cprofile_stage
+        if cprofile_path is None and cprofile_stage is not None:
+            cprofile_path = f"{cprofile_stage}.prof"
+        self.cprofile_path = cprofile_path
+        self.stages = []
+        self.started_tracing = False
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+
+    def close(self):
+        """Stop tracing memory, if this profiler started it."""
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+    @contextlib.contextmanager
+    def __call__(self, name, stats):
+        if self.trace_memory:
+            start_bytes, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+
+        profile = None
+        if name == self.cprofile_stage:
+            profile = cProfile.Profile()
+            profile.enable()
+
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+        try:
+            yield
+        finally:
+            record = {"stage": name, "rows": stats.get("rows")}
+            if not self.trace_memory:
+                record["wall_seconds"] = time.perf_counter() - start_wall
+                record["cpu_seconds"] = time.process_time() - start_cpu
+            if profile is not None:
+                profile.disable()
+                profile.dump_stats(self.cprofile_path)
+            if self.trace_memory:
+                end_bytes, peak_bytes = tracemalloc.get_traced_memory()
+                record["memory_delta_bytes"] = end_bytes - start_bytes
+                record["memory_peak_bytes"] = peak_bytes - start_bytes
+            self.stages.append(record)
+
+    def report(self):
+        report = {"stages": self.stages}
+        if not self.trace_memory:
+            report["wall_seconds"] = sum(record["wall_seconds"] for record in self.stages)
+            report["cpu_seconds"] = sum(record["cpu_seconds"] for record in self.stages)
+        return report
+
+    def write_report(self, report_path):
+        """Write the report as JSON to a file, or to stderr for "--".
+
+        stdout is reserved for the rolls themselves.
+        """
+        if report_path == "--":
+            json.dump(self.report(), sys.stderr, indent=2)
+            sys.stderr.write("\n")
+        else:
+            with open(report_path, "w") as report_file:
+                json.dump(self.report(), report_file, indent=2)
@@ -15,29 +15,35 @@
 # limitations under the License.
 
 import argparse
-import io
+import contextlib
+import itertools
+import sys
 
 import numpy
 import pandas
 
 import helpers
+import profiling
 
 
-def load_dfs():
-    all_symbols = pandas.read_csv(
-        helpers.NASDAQ_DIR / "allsymbols.txt", header=None, names=["symbol"]
-    )
+def load_dfs(db=None, symbols_path=None):
+    if db is None:
+        db = helpers.DB
+    if symbols_path is None:
+        symbols_path = helpers.NASDAQ_DIR / "allsymbols.txt"
+
+    all_symbols = pandas.read_csv(symbols_path, header=None, names=["symbol"])
     quote = pandas.read_sql(
         "SELECT symbol, market_cap_usd AS market_cap FROM quotes ORDER BY symbol ASC",
-        helpers.DB,
+        db,
     )
     income = pandas.read_sql(
         "SELECT symbol, profit, revenue, currency FROM incomes ORDER BY symbol ASC",
-        helpers.DB,
+        db,
     )
     balance_sheet = pandas.read_sql(
         "SELECT symbol, book, currency FROM balance_sheets ORDER BY symbol ASC",
-        helpers.DB,
+        db,
     )
     return all_symbols, quote, income, balance_sheet
 
@@ -49,26 +55,13 @@ def add_usd_column_from_forex(df, column):
     )
 
 
-def output_dataframe(result, output_path, format):
-    if format == "csv":
-        if output_path == "--":
-            with io.StringIO() as out:
-                result.to_csv(out, index=False)
-                print(out.getvalue())
-        else:
-            result.to_csv(output_path, index=False)
-    elif format == "text":
-        if output_path != "--":
-            raise ValueError("text output to file not supported")
-        print(result)
-
-
-def main(number_of_rolls=1, output_path="--", format="csv"):
-    all_symbols, quote, income, balance_sheet = load_dfs()
+def convert_currencies(income, balance_sheet):
     add_usd_column_from_forex(income, "revenue")
     add_usd_column_from_forex(income, "profit")
     add_usd_column_from_forex(balance_sheet, "book")
 
+
+def merge_screen(all_symbols, quote, income, balance_sheet):
     screen = all_symbols.merge(
         quote.merge(
             income.merge(
@@ -83,28 +76,295 @@ def main(number_of_rolls=1, output_path="--", format="csv"):
         how="left",
     ).fillna(value=0)
     screen.drop_duplicates(keep="last")
-    screen_ones = numpy.ones(len(screen.index))
+    return screen
+
+
+# Even weight seemed to skew too heavily towards value. Place a more weight in
+# market cap, since market risk is the main factor I want to target.
+FORMULA = {
+    "usd_book": 1,
+    "usd_profit": 2,
+    "usd_revenue": 2,
+    "market_cap": 5,
+}
+
+
+def log_features(screen, columns):
+    """Log of each formula input, as a (symbols x columns) matrix.
 
-    # Even weight seemed to skew too heavily towards value. Place a more weight in
-    # market cap, since market risk is the main factor I want to target.
+    Values below 1 (including losses) are clamped to 1 so that they don't
+    contribute to the score.
+    """
+    return numpy.log(numpy.fmax(1.0, screen[list(columns)].to_numpy(dtype=float)))
+
+
+def score_screen(screen, formula=FORMULA):
+    # The score is a weighted geometric mean of the inputs.
+    coefficients = numpy.array(list(formula.values()), dtype=float)
     screen["average"] = numpy.exp(
-        (1.0 / 10.0)
-        * (
-            1 * numpy.log(numpy.fmax(screen_ones, screen["usd_book"]))
-            + 2 * numpy.log(numpy.fmax(screen_ones, screen["usd_profit"]))
-            + 2 * numpy.log(numpy.fmax(screen_ones, screen["usd_revenue"]))
-            + 5 * numpy.log(numpy.fmax(screen_ones, screen["market_cap"]))
+        log_features(screen, tuple(formula)) @ (coefficients / coefficients.sum())
+    )
+    return screen
+
+
+OUTPUT_COLUMNS = {
+    "all": None,
+    "weight": ["symbol", "average"],
+}
+
+# Rolls are sampled and written this many rows at a time so that memory use
+# is bounded no matter how many rolls are requested.
+CHUNK_SIZE = 100_000
+
+
+def sample_chunks(screen, number_of_rolls, chunk_size=CHUNK_SIZE):
+    """Sample rolls with replacement, yielding at most chunk_size rows at once.
+
+    Rolls are independent of each other, so sampling in chunks is equivalent
+    to sampling everything at once. Always yields at least one (possibly
+    empty) chunk so that writers can emit a header.
+    """
+    for start in range(0, max(number_of_rolls, 1), chunk_size):
+        rolls = min(chunk_size, number_of_rolls - start)
+        yield screen.sample(n=rolls, weights=screen["average"], replace=True)
+
+
+@contextlib.contextmanager
+def open_output(output_path, binary=False):
+    if output_path == "--":
+        yield sys.stdout.buffer if binary else sys.stdout
+    elif binary:
+        with open(output_path, "wb") as out:
+            yield out
+    else:
+        with open(output_path, "w", newline="") as out:
+            yield out
+
+
+def write_csv(chunks, out):
+    header = True
+    for chunk in chunks:
+        chunk.to_csv(out, index=False, header=header)
+        header = False
+
+
+def text_layout(screen):
+    """Formatters and column widths shared by every chunk of text output.
+
+    Widths come from all of the rows that could be sampled, so that rows in
+    later chunks line up with the header written with the first chunk.
+    """
+    formatters = {
+        column: "{:.6g}".format
+        for column in screen.columns
+        if pandas.api.types.is_float_dtype(screen[column])
+    }
+    col_space = {}
+    for column in screen.columns:
+        lengths = screen[column].map(formatters.get(column, str)).str.len()
+        col_space[column] = max(len(str(column)), int(lengths.max()) if len(lengths) else 0)
+    return formatters, col_space
+
+
+def write_text(chunks, out, screen=None):
+    chunks = iter(chunks)
+    if screen is None:
+        # Without the screen, the best we can do is size columns to fit the
+        # first chunk.
+        first = next(chunks, None)
+        if first is None:
+            return
+        screen = first
+        chunks = itertools.chain([first], chunks)
+    formatters, col_space = text_layout(screen)
+
+    header = True
+    for chunk in chunks:
+        out.write(
+            chunk.to_string(
+                header=header, index=False, formatters=formatters, col_space=col_space
+            )
         )
+        out.write("\n")
+        header = False
+
+
+def write_jsonl(chunks, out):
+    for chunk in chunks:
+        chunk.to_json(out, orient="records", lines=True)
+
+
+def to_arrow_table(chunk, schema=None):
+    import pyarrow
+
+    # Missing currencies are filled with 0, leaving mixed-type object columns
+    # which Arrow can't convert.
+    chunk = chunk.astype(
+        {column: str for column in chunk.columns if chunk[column].dtype == object}
     )
+    return pyarrow.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+
+
+def write_parquet(chunks, out):
+    import pyarrow.parquet
+
+    writer = None
+    try:
+        for chunk in chunks:
+            if writer is None:
+                table = to_arrow_table(chunk)
+                writer = pyarrow.parquet.ParquetWriter(out, table.schema)
+            else:
+                table = to_arrow_table(chunk, schema=table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def write_arrow(chunks, out):
+    import pyarrow.ipc
+
+    writer = None
+    try:
+        for chunk in chunks:
+            if writer is None:
+                table = to_arrow_table(chunk)
+                writer = pyarrow.ipc.new_file(out, table.schema)
+            else:
+                table = to_arrow_table(chunk, schema=table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+OUTPUT_WRITERS = {
+    "csv": write_csv,
+    "text": write_text,
+    "jsonl": write_jsonl,
+    "parquet": write_parquet,
+    "arrow": write_arrow,
+}
+BINARY_FORMATS = {"parquet", "arrow"}
+
+
+def output_chunks(chunks, output_path, format, screen=None):
+    """Write chunks of rolls in format.
+
+    screen is the frame the chunks were sampled from. It's used to align the
+    columns of text output.
+    """
+    if format not in OUTPUT_WRITERS:
+        raise ValueError(f"unsupported output format: {format}")
+    kwargs = {"screen": screen} if format == "text" else {}
+    with open_output(output_path, binary=format in BINARY_FORMATS) as out:
+        OUTPUT_WRITERS[format](chunks, out, **kwargs)
+
+
+def output_dataframe(result, output_path, format):
+    output_chunks([result], output_path, format)
+
+
+# Sampling is lazy, so its time is counted as part of output.
+STAGES = ("load", "convert", "merge", "score", "output")
+
 
-    result = screen.sample(n=number_of_rolls, weights=screen["average"], replace=True)
-    output_dataframe(result, output_path, format)
+@contextlib.contextmanager
+def run_stage(name, hooks=()):
+    """Run a stage of the pipeline inside each hook.
+
+    A hook is called as ``hook(name, stats)`` and returns a context manager.
+    The stage sets ``stats["rows"]`` before the hooks exit.
+    """
+    stats = {"stage": name}
+    with contextlib.ExitStack() as stack:
+        for hook in hooks:
+            stack.enter_context(hook(name, stats))
+        yield stats
+
+
+def main(
+    number_of_rolls=1,
+    output_path="--",
+    format="csv",
+    columns="all",
+    chunk_size=CHUNK_SIZE,
+    hooks=(),
+    db=None,
+    symbols_path=None,
+    forex_path=None,
+):
+    """Roll number_of_rolls times, returning the screen that was sampled.
+
+    db, symbols_path, and forex_path override the default data sources.
+    """
+    with run_stage("load", hooks) as stats:
+        all_symbols, quote, income, balance_sheet = load_dfs(
+            db=db, symbols_path=symbols_path
+        )
+        stats["rows"] = sum(
+            len(df.index) for df in (all_symbols, quote, income, balance_sheet)
+        )
+    with run_stage("convert", hooks) as stats:
+        if forex_path is not None:
+            helpers.load_forex(forex_path)
+        convert_currencies(income, balance_sheet)
+        stats["rows"] = len(income.index) + len(balance_sheet.index)
+    with run_stage("merge", hooks) as stats:
+        screen = merge_screen(all_symbols, quote, income, balance_sheet)
+        stats["rows"] = len(screen.index)
+    with run_stage("score", hooks) as stats:
+        score_screen(screen)
+        stats["rows"] = len(screen.index)
+    with run_stage("output", hooks) as stats:
+        if OUTPUT_COLUMNS[columns] is not None:
+            screen = screen[OUTPUT_COLUMNS[columns]]
+        chunks = sample_chunks(screen, number_of_rolls, chunk_size=chunk_size)
+        output_chunks(chunks, output_path, format, screen=screen)
+        stats["rows"] = number_of_rolls
+    return screen
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(prog="stockdice.py")
     parser.add_argument("-n", "--number", type=int, default=1)
     parser.add_argument("-o", "--output", default="--")
-    parser.add_argument("-f", "--format", default="csv")
+    parser.add_argument("-f", "--format", default="csv", choices=OUTPUT_WRITERS)
+    parser.add_argument("-c", "--columns", default="all", choices=OUTPUT_COLUMNS)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="--",
+        help="write a JSON report of per-stage timings to this path (default: stderr)",
+    )
+    parser.add_argument(
+        "--profile-memory",
+        action="store_true",
+        help="record memory per stage instead of times, which tracing would skew",
+    )
+    parser.add_argument("--cprofile-stage", choices=STAGES)
+    parser.add_argument("--cprofile-output")
     args = parser.parse_args()
-    main(number_of_rolls=args.number, output_path=args.output, format=args.format)
+
+    hooks = []
+    if args.profile is not None or args.cprofile_stage is not None:
+        profiler = profiling.StageProfiler(
+            trace_memory=args.profile_memory,
+            cprofile_stage=args.cprofile_stage,
+            cprofile_path=args.cprofile_output,
+        )
+        hooks.append(profiler)
+    main(
+        number_of_rolls=args.number,
+        output_path=args.output,
+        format=args.format,
+        columns=args.columns,
+        chunk_size=args.chunk_size,
+        hooks=hooks,
+    )
+    if hooks:
+        profiler.close()
+    if args.profile is not None:
+        profiler.write_report(args.profile)
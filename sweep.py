@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# coding: utf-8
+# Copyright 2026 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+import concurrent.futures
+import itertools
+
+import numpy
+import pandas
+
+import stockdice
+
+
+# Inputs to the score, in the order of the grid's coefficients. Kept separate
+# from stockdice.FORMULA, which may use only some of them.
+SWEEP_COLUMNS = ("usd_book", "usd_profit", "usd_revenue", "market_cap")
+DEFAULT_GRID = (0, 1, 2, 3, 4, 5)
+TOP_N = 10
+QUANTILES = {"p50": 0.5, "p90": 0.9, "p99": 0.99}
+
+# Limit on the size of each (symbols x variants) matrix. Evaluating a chunk
+# makes a few temporary copies, so peak memory is several times this.
+MAX_ELEMENTS = 2 ** 22
+
+# Set in each worker process, so the feature matrix is only sent once.
+worker_features = None
+worker_market_cap_probability = None
+
+
+def coefficient_grid(*values):
+    """All combinations of coefficients, one row per variant.
+
+    Variants whose coefficients sum to zero have no score, so they are
+    skipped.
+    """
+    grid = numpy.array(list(itertools.product(*values)), dtype=float)
+    return grid[grid.sum(axis=1) > 0]
+
+
+def market_cap_probability(screen):
+    market_cap = numpy.fmax(1.0, screen["market_cap"].to_numpy(dtype=float))
+    return market_cap / market_cap.sum()
+
+
+def evaluate(features, market_cap_probability, coefficients):
+    """Summarize the probability distribution of a chunk of variants."""
+    # Same weighted geometric mean as stockdice.score_screen, but kept in log
+    # space so that normalizing can't overflow.
+    scores = features @ (coefficients / coefficients.sum(axis=1, keepdims=True)).T
+    scores -= scores.max(axis=0)
+    probability = numpy.exp(scores)
+    probability /= probability.sum(axis=0)
+
+    top_n = min(TOP_N, len(probability))
+    summary = {
+        f"top{TOP_N}_share": numpy.partition(probability, -top_n, axis=0)[
+            -top_n:
+        ].sum(axis=0),
+        "effective_holdings": 1.0 / numpy.square(probability).sum(axis=0),
+        # Total variation distance: the share of probability that would have
+        # to move to get back to pure market cap weighting.
+        "market_cap_distance": 0.5
+        * numpy.abs(probability - market_cap_probability[:, numpy.newaxis]).sum(axis=0),
+    }
+    quantiles = numpy.quantile(probability, list(QUANTILES.values()), axis=0)
+    summary.update(zip(QUANTILES, quantiles))
+    summary["max_probability"] = probability.max(axis=0)
+    return summary
+
+
+def init_worker(features, market_cap_probability):
+    global worker_features, worker_market_cap_probability
+    worker_features = features
+    worker_market_cap_probability = market_cap_probability
+
+
+def evaluate_in_worker(coefficients):
+    return evaluate(worker_features, worker_market_cap_probability, coefficients)
+
+
+def sweep(
+    features,
+    market_cap_probability,
+    grid,
+    columns=SWEEP_COLUMNS,
+    max_elements=MAX_ELEMENTS,
+    jobs=1,
+):
+    """Evaluate every variant in grid, in chunks of variants."""
+    variants_per_chunk = max(1, max_elements // max(1, len(features)))
+    chunks = [
+        grid[start : start + variants_per_chunk]
+        for start in range(0, len(grid), variants_per_chunk)
+    ]
+
+    if jobs == 1:
+        summaries = [
+            evaluate(features, market_cap_probability, chunk) for chunk in chunks
+        ]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=jobs,
+            initializer=init_worker,
+            initargs=(features, market_cap_probability),
+        ) as executor:
+            summaries = list(executor.map(evaluate_in_worker, chunks))
+
+    report = pandas.DataFrame(grid, columns=list(columns))
+    for name in summaries[0] if summaries else ():
+        report[name] = numpy.concatenate([summary[name] for summary in summaries])
+    return report
+
+
+def main(grid, output_path="--", format="csv", jobs=1, max_elements=MAX_ELEMENTS):
+    all_symbols, quote, income, balance_sheet = stockdice.load_dfs()
+    stockdice.convert_currencies(income, balance_sheet)
+    screen = stockdice.merge_screen(all_symbols, quote, income, balance_sheet)
+
+    report = sweep(
+        stockdice.log_features(screen, SWEEP_COLUMNS),
+        market_cap_probability(screen),
+        grid,
+        columns=SWEEP_COLUMNS,
+        max_elements=max_elements,
+        jobs=jobs,
+    )
+    stockdice.output_dataframe(report, output_path, format)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="sweep.py")
+    parser.add_argument("--book", type=float, nargs="+", default=DEFAULT_GRID)
+    parser.add_argument("--profit", type=float, nargs="+", default=DEFAULT_GRID)
+    parser.add_argument("--revenue", type=float, nargs="+", default=DEFAULT_GRID)
+    parser.add_argument("--market-cap", type=float, nargs="+", default=DEFAULT_GRID)
+    parser.add_argument("-j", "--jobs", type=int, default=1)
+    parser.add_argument("--max-elements", type=int, default=MAX_ELEMENTS)
+    parser.add_argument("-o", "--output", default="--")
+    parser.add_argument(
+        "-f", "--format", default="csv", choices=stockdice.OUTPUT_WRITERS
+    )
+    args = parser.parse_args()
+    # Same order as SWEEP_COLUMNS.
+    grid = coefficient_grid(args.book, args.profit, args.revenue, args.market_cap)
+    main(
+        grid,
+        output_path=args.output,
+        format=args.format,
+        jobs=args.jobs,
+        max_elements=args.max_elements,
+    )
@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+# coding: utf-8
+# Copyright 2026 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+import datetime
+import pathlib
+import sqlite3
+import string
+
+import numpy
+
+import initialize_db
+
+
+# Approximate USD per unit of currency. Some are written as USD/XXX pairs to
+# exercise both directions of the forex parser.
+FOREX_TO_USD = {
+    "EUR": 1.08,
+    "GBP": 1.27,
+    "CAD": 0.73,
+    "CNY": 0.14,
+    "BRL": 0.2,
+    "ILS": 0.27,
+    "JPY": 0.0067,
+    "INR": 0.012,
+}
+INVERTED_PAIRS = {"JPY", "INR"}
+
+# Most listings report in USD, with a long tail of foreign filers.
+CURRENCY_WEIGHTS = {
+    "USD": 0.8,
+    "CNY": 0.04,
+    "EUR": 0.03,
+    "JPY": 0.03,
+    "GBP": 0.02,
+    "CAD": 0.02,
+    "INR": 0.02,
+    "BRL": 0.02,
+    "ILS": 0.02,
+}
+
+# Fraction of symbols with no row at all in each table.
+MISSING_QUOTE = 0.05
+MISSING_INCOME = 0.15
+MISSING_BALANCE_SHEET = 0.15
+# Fraction of symbols with a row, but all zeros and no currency. This is what
+# download_values.py writes when FMP returns nothing.
+EMPTY_VALUES = 0.1
+# Extra symbols in the DB that are no longer listed in allsymbols.txt.
+DELISTED = 0.02
+
+
+def symbol_for_index(index: int) -> str:
+    """Bijective base-26: 0 -> A, 25 -> Z, 26 -> AA, ..."""
+    letters = []
+    index += 1
+    while index > 0:
+        index, remainder = divmod(index - 1, 26)
+        letters.append(string.ascii_uppercase[remainder])
+    return "".join(reversed(letters))
+
+
+def write_symbols(symbols_path, symbols):
+    with open(symbols_path, "w") as symbols_file:
+        for symbol in symbols:
+            symbols_file.write(symbol + "\n")
+
+
+def write_forex(csv_path):
+    with open(csv_path, "w") as out:
+        for currency, price in sorted(FOREX_TO_USD.items()):
+            if currency in INVERTED_PAIRS:
+                ticker = f"USD/{currency}"
+                price = 1.0 / price
+            else:
+                ticker = f"{currency}/USD"
+            # Use a small spread around the price.
+            out.write(f"{ticker},{price * 0.999},{price * 1.001}\n")
+        # download_forex.py writes None for pairs with no quote.
+        out.write("XAU/USD,None,None\n")
+
+
+def random_currencies(rng, size):
+    currencies = numpy.array(list(CURRENCY_WEIGHTS), dtype=object)
+    weights = numpy.array(list(CURRENCY_WEIGHTS.values()))
+    return rng.choice(currencies, size=size, p=weights / weights.sum())
+
+
+def usd_to_local(currencies, values):
+    rates = numpy.array([FOREX_TO_USD.get(currency, 1.0) for currency in currencies])
+    return values / rates
+
+
+def present_rows(rng, size, missing):
+    """Pick which symbols have a row in a table, and which of those are empty."""
+    present = rng.random(size) >= missing
+    empty = rng.random(size) < EMPTY_VALUES
+    return present, empty & present
+
+
+def insert_quotes(db, rng, symbols, market_caps, last_updated_us):
+    present, empty = present_rows(rng, len(symbols), MISSING_QUOTE)
+    market_caps = numpy.where(empty, 0.0, market_caps)
+    db.executemany(
+        "INSERT INTO quotes (symbol, market_cap_usd, last_updated_us) VALUES (?, ?, ?)",
+        (
+            (symbol, market_cap, last_updated_us)
+            for symbol, market_cap in zip(
+                symbols[present].tolist(), market_caps[present].tolist()
+            )
+        ),
+    )
+
+
+def insert_incomes(db, rng, symbols, market_caps, last_updated_us):
+    size = len(symbols)
+    present, empty = present_rows(rng, size, MISSING_INCOME)
+    currencies = random_currencies(rng, size)
+    revenues = usd_to_local(currencies, market_caps * rng.lognormal(0.0, 1.0, size))
+    # Margins are sometimes negative.
+    profits = revenues * rng.normal(0.3, 0.3, size)
+    revenues = numpy.where(empty, 0.0, revenues)
+    profits = numpy.where(empty, 0.0, profits)
+    currencies = numpy.where(empty, None, currencies)
+    db.executemany(
+        """INSERT INTO incomes
+        (symbol, profit, revenue, currency, last_updated_us)
+        VALUES (?, ?, ?, ?, ?)
+        """,
+        (
+            (symbol, profit, revenue, currency, last_updated_us)
+            for symbol, profit, revenue, currency in zip(
+                symbols[present].tolist(),
+                profits[present].tolist(),
+                revenues[present].tolist(),
+                currencies[present].tolist(),
+            )
+        ),
+    )
+
+
+def insert_balance_sheets(db, rng, symbols, market_caps, last_updated_us):
+    size = len(symbols)
+    present, empty = present_rows(rng, size, MISSING_BALANCE_SHEET)
+    currencies = random_currencies(rng, size)
+    books = usd_to_local(currencies, market_caps * rng.lognormal(-0.7, 1.0, size))
+    books = numpy.where(empty, 0.0, books)
+    currencies = numpy.where(empty, None, currencies)
+    db.executemany(
+        """INSERT INTO balance_sheets
+        (symbol, book, currency, last_updated_us)
+        VALUES (?, ?, ?, ?)
+        """,
+        (
+            (symbol, book, currency, last_updated_us)
+            for symbol, book, currency in zip(
+                symbols[present].tolist(),
+                books[present].tolist(),
+                currencies[present].tolist(),
+            )
+        ),
+    )
+
+
+def generate(directory, size, seed=0):
+    """Write a synthetic universe of ``size`` listed symbols to ``directory``.
+
+    Returns the paths to the symbols file, forex CSV, and SQLite database.
+    """
+    directory = pathlib.Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    symbols_path = directory / "allsymbols.txt"
+    forex_path = directory / "forex.csv"
+    db_path = directory / "stockdice.sqlite"
+    rng = numpy.random.default_rng(seed)
+
+    listed = [symbol_for_index(index) for index in range(size)]
+    delisted = [
+        symbol_for_index(index) for index in range(size, size + int(size * DELISTED))
+    ]
+    write_symbols(symbols_path, listed)
+    write_forex(forex_path)
+
+    symbols = numpy.array(listed + delisted, dtype=object)
+    market_caps = rng.lognormal(numpy.log(5e8), 2.5, len(symbols))
+    epoch = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    last_updated_us = (now - epoch) // datetime.timedelta(microseconds=1)
+
+    db_path.unlink(missing_ok=True)
+    db = sqlite3.connect(db_path)
+    try:
+        initialize_db.migrate(db)
+        insert_quotes(db, rng, symbols, market_caps, last_updated_us)
+        insert_incomes(db, rng, symbols, market_caps, last_updated_us)
+        insert_balance_sheets(db, rng, symbols, market_caps, last_updated_us)
+        db.commit()
+    finally:
+        db.close()
+
+    return symbols_path, forex_path, db_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="synthetic_universe.py")
+    parser.add_argument("-s", "--size", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("directory")
+    args = parser.parse_args()
+    generate(args.directory, args.size, seed=args.seed)
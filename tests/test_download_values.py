@@ -0,0 +1,186 @@
+# coding: utf-8
+# Copyright 2026 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import contextlib
+import datetime
+import io
+import sqlite3
+
+import pytest
+
+from .. import download_values
+from .. import initialize_db
+
+
+DAY_US = datetime.timedelta(days=1) / datetime.timedelta(microseconds=1)
+
+
+class FakeResponse:
+    status = 200
+
+    def __init__(self, resp_json):
+        self.resp_json = resp_json
+
+    async def json(self):
+        return self.resp_json
+
+
+class FakeSession:
+    def __init__(self, resp_json):
+        self.resp_json = resp_json
+
+    @contextlib.asynccontextmanager
+    async def get(self, url):
+        yield FakeResponse(self.resp_json)
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = sqlite3.connect(":memory:")
+    initialize_db.migrate(db)
+    monkeypatch.setattr(download_values, "DB", db)
+    yield db
+    db.close()
+
+
+def test_record_lookup_backs_off_exponentially(db):
+    now_us = 1_000 * DAY_US
+    next_checks = []
+    for _ in range(10):
+        download_values.record_lookup("incomes", "ABCDW", True, now_us)
+        (next_check_us,) = db.execute("SELECT next_check_us FROM empty_lookups").fetchone()
+        next_checks.append((next_check_us - now_us) / DAY_US)
+
+    assert next_checks == [1, 2, 4, 8, 16, 32, 64, 64, 64, 64]
+    assert download_values.is_known_empty("incomes", "ABCDW", now_us)
+    assert not download_values.is_known_empty("quotes", "ABCDW", now_us)
+    assert not download_values.is_known_empty("incomes", "ABCDW", now_us + 65 * DAY_US)
+
+    download_values.record_lookup("incomes", "ABCDW", False, now_us)
+    assert not download_values.is_known_empty("incomes", "ABCDW", now_us)
+
+
+@pytest.mark.parametrize(
+    ("resp_json", "expected_empty"),
+    (
+        ([], True),
+        ([{"reportedCurrency": "USD"}], True),
+        ([{"revenue": 10, "grossProfit": 5, "reportedCurrency": "USD"}], False),
+    ),
+)
+def test_download_income_records_empty_lookup(db, resp_json, expected_empty):
+    session = FakeSession(resp_json)
+
+    asyncio.run(download_values.download_income(session, "ABCDW", 1_000 * DAY_US))
+
+    assert download_values.is_known_empty("incomes", "ABCDW", 1_000 * DAY_US) == expected_empty
+    assert db.execute("SELECT COUNT(*) FROM incomes").fetchone() == (1,)
+
+
+def test_report_empty(db):
+    download_values.record_lookup("quotes", "ABCDU", True, 0)
+    download_values.record_lookup("quotes", "ABCDU", True, 0)
+    out = io.StringIO()
+
+    download_values.report_empty("quotes", out=out)
+
+    assert out.getvalue().splitlines() == [
+        "symbol,empty_count,last_checked,next_check",
+        "ABCDU,2,1970-01-01T00:00:00+00:00,1970-01-03T00:00:00+00:00",
+    ]
+
+
+def test_ingest_bulk(db, tmp_path):
+    bulk_path = tmp_path / "income-statement-bulk.csv"
+    bulk_path.write_text(
+        "date,symbol,reportedCurrency,cik,revenue,costOfRevenue,grossProfit\n"
+        "2024-12-31,AAA,USD,1,100,40,60\n"
+        "2024-12-31,UNLISTED,USD,2,5,1,4\n"
+        "2023-12-31,BBB,EUR,3,10,5,5\n"
+        "2025-12-31,AAA,USD,1,200,80,120\n"
+        "2024-12-31,NA,,4,,,\n"
+        "2024-12-31,BBB,EUR,3,20,10,10\n"
+        "2022-12-31,AAA,USD,1,50,20,30\n"
+    )
+    download_values.record_lookup("incomes", "BBB", True, 0)
+    download_values.record_lookup("incomes", "NA", True, 0)
+
+    rows = download_values.ingest_bulk(
+        "incomes", bulk_path, symbols=["AAA", "BBB", "NA"], chunk_size=2
+    )
+
+    assert rows == 3
+    got = db.execute(
+        "SELECT symbol, profit, revenue, currency FROM incomes ORDER BY symbol"
+    ).fetchall()
+    assert got == [
+        ("AAA", 120.0, 200.0, "USD"),
+        ("BBB", 10.0, 20.0, "EUR"),
+        ("NA", 0.0, 0.0, None),
+    ]
+    # Blank rows count as empty lookups, like the per-symbol downloads.
+    assert db.execute(
+        "SELECT symbol, empty_count, next_check_us - last_checked_us FROM empty_lookups"
+    ).fetchall() == [("NA", 2, 2 * DAY_US)]
+
+
+def test_ingest_bulk_keeps_newer_rows(db, tmp_path):
+    bulk_path = tmp_path / "balance-sheet-statement-bulk.csv"
+    bulk_path.write_text(
+        "date,symbol,reportedCurrency,totalStockholdersEquity\n"
+        "2025-06-30,NEWER,USD,1\n"
+        "2025-06-30,OLDER,USD,2\n"
+        "2025-06-30,FRESH,USD,3\n"
+        "2025-06-30,STALE,USD,4\n"
+    )
+    now_us = (
+        datetime.datetime.now(datetime.timezone.utc)
+        - datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+    ) / datetime.timedelta(microseconds=1)
+    db.executemany(
+        download_values.UPSERT_BALANCE_SHEET,
+        (
+            {
+                "symbol": symbol,
+                "book": 100.0,
+                "currency": "EUR",
+                "statement_date": statement_date,
+                "last_updated_us": last_updated_us,
+            }
+            for symbol, statement_date, last_updated_us in (
+                ("NEWER", "2025-09-30", 0),
+                ("OLDER", "2025-03-31", now_us),
+                # Downloaded before statement dates were recorded.
+                ("FRESH", None, now_us),
+                ("STALE", None, now_us - 2 * DAY_US),
+            )
+        ),
+    )
+
+    rows = download_values.ingest_bulk(
+        "balance_sheets", bulk_path, symbols=["NEWER", "OLDER", "FRESH", "STALE"]
+    )
+
+    assert rows == 2
+    got = db.execute(
+        "SELECT symbol, book, statement_date FROM balance_sheets ORDER BY symbol"
+    ).fetchall()
+    assert got == [
+        ("FRESH", 100.0, None),
+        ("NEWER", 100.0, "2025-09-30"),
+        ("OLDER", 2.0, "2025-06-30"),
+        ("STALE", 4.0, "2025-06-30"),
+    ]
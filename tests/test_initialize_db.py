@@ -0,0 +1,170 @@
+# coding: utf-8
+# Copyright 2026 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sqlite3
+
+import pytest
+
+from .. import initialize_db
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = sqlite3.connect(tmp_path / "stockdice.sqlite")
+    yield db
+    db.close()
+
+
+def test_migrate_keeps_existing_data(db):
+    # A database created before migrations were versioned.
+    db.execute(
+        "CREATE TABLE quotes(symbol STRING PRIMARY KEY, market_cap_usd REAL, last_updated_us INTEGER);"
+    )
+    db.execute("INSERT INTO quotes VALUES ('AAA', 100.0, 1)")
+    db.commit()
+
+    version = initialize_db.migrate(db)
+
+    assert version == len(initialize_db.MIGRATIONS)
+    assert initialize_db.schema_version(db) == version
+    assert db.execute("SELECT * FROM quotes").fetchall() == [("AAA", 100.0, 1)]
+    indexes = {
+        name
+        for (name,) in db.execute("SELECT name FROM sqlite_master WHERE type = 'index'")
+    }
+    assert "quotes_last_updated_us" in indexes
+    assert "incomes_last_updated_us" in indexes
+
+    # Migrating again is a no-op.
+    assert initialize_db.migrate(db) == version
+
+
+def test_load_legacy_csv(db, tmp_path):
+    initialize_db.migrate(db)
+    db.execute(
+        """INSERT INTO incomes (symbol, profit, revenue, currency, last_updated_us)
+        VALUES ('FRESH', 1.0, 2.0, 'USD', 123)
+        """
+    )
+    db.commit()
+    csv_path = tmp_path / "income-statement.csv"
+    csv_path.write_text(
+        "AAA,1.0,10.0,USD\n"
+        "BBB,,,\n"
+        "AAA,2.0,20.0,EUR\n"
+        "FRESH,5.0,6.0,USD\n"
+    )
+
+    rows = initialize_db.load_legacy_csv("incomes", csv_path, db=db, batch_size=3)
+
+    assert rows == 4
+    got = db.execute(
+        "SELECT symbol, profit, revenue, currency, last_updated_us FROM incomes ORDER BY symbol"
+    ).fetchall()
+    assert got == [
+        ("AAA", 2.0, 20.0, "EUR", None),
+        ("BBB", None, None, None, None),
+        ("FRESH", 1.0, 2.0, "USD", 123),
+    ]
+    assert db.execute("SELECT COUNT(*) FROM import_progress").fetchone() == (0,)
+
+
+def test_load_legacy_csv_resumes(db, tmp_path):
+    initialize_db.migrate(db)
+    csv_path = tmp_path / "quote.csv"
+    csv_path.write_text("AAA,1.0\nBBB,2.0\nCCC,3.0\n")
+    # Pretend a previous import was interrupted after the first two rows.
+    db.execute(
+        "INSERT INTO import_progress VALUES (?, 2)",
+        (initialize_db.import_source("quotes", csv_path),),
+    )
+    db.commit()
+
+    rows = initialize_db.load_legacy_csv("quotes", csv_path, db=db)
+
+    assert rows == 3
+    assert db.execute("SELECT symbol FROM quotes").fetchall() == [("CCC",)]
+
+
+def test_load_legacy_csv_restarts_replaced_file(db, tmp_path):
+    initialize_db.migrate(db)
+    csv_path = tmp_path / "quote.csv"
+    csv_path.write_text("AAA,1.0\nBBB,2.0\n")
+    db.execute(
+        "INSERT INTO import_progress VALUES (?, 2)",
+        (initialize_db.import_source("quotes", csv_path),),
+    )
+    db.commit()
+    # Replace the file after the interrupted import.
+    csv_path.write_text("XXX,1.0\nYYY,2.0\nZZZ,3.0\n")
+
+    rows = initialize_db.load_legacy_csv("quotes", csv_path, db=db)
+
+    assert rows == 3
+    assert db.execute("SELECT symbol FROM quotes ORDER BY symbol").fetchall() == [
+        ("XXX",),
+        ("YYY",),
+        ("ZZZ",),
+    ]
+    assert db.execute("SELECT COUNT(*) FROM import_progress").fetchone() == (0,)
+
+
+def test_bulk_load_pragmas_restores_settings(db):
+    before = [
+        db.execute(f"PRAGMA {pragma}").fetchone()
+        for pragma in ("synchronous", "cache_size", "temp_store")
+    ]
+
+    with initialize_db.bulk_load_pragmas(db):
+        assert db.execute("PRAGMA temp_store").fetchone() == (2,)
+
+    after = [
+        db.execute(f"PRAGMA {pragma}").fetchone()
+        for pragma in ("synchronous", "cache_size", "temp_store")
+    ]
+    assert after == before
+
+
+def test_load_legacy_csv_failed_batch(db, tmp_path):
+    initialize_db.migrate(db)
+    db.execute(
+        """CREATE TRIGGER reject_bad BEFORE INSERT ON quotes
+        WHEN NEW.symbol = 'BAD'
+        BEGIN SELECT RAISE(ABORT, 'bad symbol'); END
+        """
+    )
+    db.commit()
+    before = [
+        db.execute(f"PRAGMA {pragma}").fetchone()
+        for pragma in ("synchronous", "cache_size", "temp_store")
+    ]
+    csv_path = tmp_path / "quote.csv"
+    csv_path.write_text("AAA,1.0\nBBB,2.0\nBAD,3.0\nCCC,4.0\n")
+
+    with pytest.raises(sqlite3.IntegrityError, match="bad symbol"):
+        initialize_db.load_legacy_csv("quotes", csv_path, db=db, batch_size=2)
+
+    assert not db.in_transaction
+    after = [
+        db.execute(f"PRAGMA {pragma}").fetchone()
+        for pragma in ("synchronous", "cache_size", "temp_store")
+    ]
+    assert after == before
+    # The first batch was committed and is checkpointed.
+    assert db.execute("SELECT symbol FROM quotes ORDER BY symbol").fetchall() == [
+        ("AAA",),
+        ("BBB",),
+    ]
+    assert db.execute("SELECT rows FROM import_progress").fetchall() == [(2,)]
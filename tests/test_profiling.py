@@ -0,0 +1,95 @@
+# coding: utf-8
+# Copyright 2026 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import pstats
+import sqlite3
+
+from .. import helpers
+from .. import profiling
+from .. import stockdice
+from .. import synthetic_universe
+
+
+def test_stage_profiler(tmp_path):
+    cprofile_path = tmp_path / "merge.prof"
+    report_path = tmp_path / "report.json"
+    profiler = profiling.StageProfiler(
+        cprofile_stage="merge", cprofile_path=cprofile_path
+    )
+
+    with stockdice.run_stage("load", [profiler]) as stats:
+        values = list(range(1000))
+        stats["rows"] = len(values)
+    with stockdice.run_stage("merge", [profiler]) as stats:
+        merged = sorted(values, reverse=True)
+        stats["rows"] = len(merged)
+    profiler.write_report(report_path)
+
+    report = json.loads(report_path.read_text())
+    assert [record["stage"] for record in report["stages"]] == ["load", "merge"]
+    assert [record["rows"] for record in report["stages"]] == [1000, 1000]
+    for record in report["stages"]:
+        assert record["wall_seconds"] >= 0
+        assert record["cpu_seconds"] >= 0
+        assert "memory_peak_bytes" not in record
+    assert report["wall_seconds"] >= 0
+    assert pstats.Stats(str(cprofile_path)).total_calls > 0
+
+
+def test_stage_profiler_memory_leaves_out_times():
+    profiler = profiling.StageProfiler(trace_memory=True)
+
+    with stockdice.run_stage("score", [profiler]) as stats:
+        values = list(range(1000))
+        stats["rows"] = len(values)
+
+    with stockdice.run_stage("output", [profiler]) as stats:
+        del values
+        stats["rows"] = 0
+    profiler.close()
+
+    score, output = profiler.stages
+    assert score["rows"] == 1000
+    assert score["memory_peak_bytes"] > 0
+    assert score["memory_delta_bytes"] > 0
+    # Memory allocated in an earlier stage and freed in this one counts.
+    assert output["memory_delta_bytes"] < 0
+    assert "wall_seconds" not in score
+    assert "wall_seconds" not in profiler.report()
+
+
+def test_main_records_every_stage(tmp_path):
+    symbols_path, forex_path, db_path = synthetic_universe.generate(
+        tmp_path, 500, seed=2
+    )
+    profiler = profiling.StageProfiler()
+    previous_forex = helpers.forex_to_usd
+    db = sqlite3.connect(db_path)
+    try:
+        stockdice.main(
+            number_of_rolls=10,
+            output_path=tmp_path / "rolls.csv",
+            hooks=[profiler],
+            db=db,
+            symbols_path=symbols_path,
+            forex_path=forex_path,
+        )
+    finally:
+        db.close()
+        helpers.forex_to_usd = previous_forex
+
+    assert tuple(record["stage"] for record in profiler.stages) == stockdice.STAGES
+    assert all(record["rows"] > 0 for record in profiler.stages)
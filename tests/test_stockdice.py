@@ -0,0 +1,106 @@
+# coding: utf-8
+# Copyright 2026 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pandas
+import pytest
+
+from .. import stockdice
+
+
+@pytest.fixture
+def screen():
+    return pandas.DataFrame(
+        {
+            "symbol": ["AAA", "BBB", "CCC"],
+            "currency": ["USD", 0, "EUR"],
+            "average": [1.0, 2.0, 3.0],
+        }
+    )
+
+
+@pytest.mark.parametrize(
+    ("number_of_rolls", "chunk_size", "expected_sizes"),
+    (
+        (0, 10, [0]),
+        (5, 10, [5]),
+        (10, 5, [5, 5]),
+        (11, 5, [5, 5, 1]),
+    ),
+)
+def test_sample_chunks(screen, number_of_rolls, chunk_size, expected_sizes):
+    chunks = stockdice.sample_chunks(screen, number_of_rolls, chunk_size=chunk_size)
+    assert [len(chunk.index) for chunk in chunks] == expected_sizes
+
+
+@pytest.mark.parametrize("format", ("csv", "jsonl", "parquet", "arrow"))
+def test_output_chunks_roundtrip(tmp_path, screen, format):
+    if format in stockdice.BINARY_FORMATS:
+        pytest.importorskip("pyarrow")
+    output_path = tmp_path / f"rolls.{format}"
+    chunks = stockdice.sample_chunks(screen, 25, chunk_size=10)
+
+    stockdice.output_chunks(chunks, output_path, format)
+
+    if format == "csv":
+        got = pandas.read_csv(output_path)
+    elif format == "jsonl":
+        got = pandas.read_json(output_path, lines=True)
+    elif format == "parquet":
+        got = pandas.read_parquet(output_path)
+    else:
+        got = pandas.read_feather(output_path)
+    assert len(got.index) == 25
+    assert list(got.columns) == ["symbol", "currency", "average"]
+    assert set(got["symbol"]) <= {"AAA", "BBB", "CCC"}
+
+
+def test_output_chunks_text_to_file(tmp_path, screen):
+    output_path = tmp_path / "rolls.txt"
+    chunks = stockdice.sample_chunks(screen, 4, chunk_size=2)
+
+    stockdice.output_chunks(chunks, output_path, "text", screen=screen)
+
+    lines = output_path.read_text().splitlines()
+    assert len(lines) == 5
+    assert lines[0].split() == ["symbol", "currency", "average"]
+
+
+def test_output_chunks_text_aligned_across_chunks(tmp_path):
+    screen = pandas.DataFrame(
+        {
+            "symbol": ["A", "BB", "CCCCCCC"],
+            "currency": ["USD", 0, "EUR"],
+            "average": [1.0, 2.0, 12345.678],
+        }
+    )
+    output_path = tmp_path / "rolls.txt"
+    chunks = stockdice.sample_chunks(screen, 30, chunk_size=3)
+
+    stockdice.output_chunks(chunks, output_path, "text", screen=screen)
+
+    lines = output_path.read_text().splitlines()
+    assert len(lines) == 31
+    assert len({len(line) for line in lines}) == 1
+    # Every value is right-aligned with its column header.
+    header = lines[0]
+    ends = [header.index(name) + len(name) for name in screen.columns]
+    for line in lines[1:]:
+        assert all(line[end - 1] != " " for end in ends)
+        assert all(end == len(line) or line[end] == " " for end in ends)
+
+
+def test_output_chunks_unsupported_format(screen):
+    with pytest.raises(ValueError):
+        stockdice.output_chunks([screen], "--", "xlsx")
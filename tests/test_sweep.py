@@ -0,0 +1,79 @@
+# coding: utf-8
+# Copyright 2026 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy
+import pandas
+import pytest
+
+from .. import stockdice
+from .. import sweep
+
+
+@pytest.fixture
+def screen():
+    rng = numpy.random.default_rng(0)
+    size = 500
+    return pandas.DataFrame(
+        {
+            "symbol": [f"S{index}" for index in range(size)],
+            "usd_book": rng.lognormal(18, 2, size),
+            "usd_profit": rng.normal(1e7, 1e8, size),
+            "usd_revenue": rng.lognormal(19, 2, size),
+            "market_cap": rng.lognormal(20, 2.5, size),
+        }
+    )
+
+
+def test_coefficient_grid_skips_all_zero():
+    grid = sweep.coefficient_grid([0, 1], [0, 2], [0], [0, 5])
+    assert len(grid) == 7
+    assert (grid.sum(axis=1) > 0).all()
+
+
+def test_sweep_matches_score_screen(screen):
+    formula = dict(zip(sweep.SWEEP_COLUMNS, [1, 2, 2, 5]))
+    grid = numpy.array([list(formula.values()), [0, 0, 0, 1], [0, 0, 0, 0.5]])
+    features = stockdice.log_features(screen, sweep.SWEEP_COLUMNS)
+    market_cap_probability = sweep.market_cap_probability(screen)
+
+    report = sweep.sweep(features, market_cap_probability, grid)
+
+    scored = stockdice.score_screen(screen.copy(), formula=formula)
+    probability = scored["average"] / scored["average"].sum()
+    assert report["effective_holdings"][0] == pytest.approx(
+        1.0 / numpy.square(probability).sum()
+    )
+    assert report["top10_share"][0] == pytest.approx(
+        probability.sort_values().iloc[-10:].sum()
+    )
+    assert report["max_probability"][0] == pytest.approx(probability.max())
+    # Only the relative size of the coefficients matters.
+    assert report["market_cap_distance"][1] == pytest.approx(0.0)
+    assert report["market_cap_distance"][2] == pytest.approx(0.0)
+    assert report["market_cap_distance"][0] > 0
+
+
+@pytest.mark.parametrize(("max_elements", "jobs"), ((1, 1), (1_000, 2)))
+def test_sweep_chunks_match_unchunked(screen, max_elements, jobs):
+    grid = sweep.coefficient_grid([0, 1, 2], [0, 2], [0, 2], [1, 5])
+    features = stockdice.log_features(screen, sweep.SWEEP_COLUMNS)
+    market_cap_probability = sweep.market_cap_probability(screen)
+
+    expected = sweep.sweep(features, market_cap_probability, grid)
+    got = sweep.sweep(
+        features, market_cap_probability, grid, max_elements=max_elements, jobs=jobs
+    )
+
+    pandas.testing.assert_frame_equal(got, expected)
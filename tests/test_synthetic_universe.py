@@ -0,0 +1,48 @@
+# coding: utf-8
+# Copyright 2026 Banana Juice LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from .. import benchmark
+from .. import synthetic_universe
+
+
+@pytest.mark.parametrize(
+    ("index", "expected"),
+    (
+        (0, "A"),
+        (25, "Z"),
+        (26, "AA"),
+        (701, "ZZ"),
+        (702, "AAA"),
+    ),
+)
+def test_symbol_for_index(index: int, expected: str):
+    assert synthetic_universe.symbol_for_index(index) == expected
+
+
+def test_run_stages(tmp_path):
+    paths = synthetic_universe.generate(tmp_path, 2_000, seed=1)
+    symbols_path, _, _ = paths
+    assert len(symbols_path.read_text().splitlines()) == 2_000
+
+    output_path = tmp_path / "rolls.csv"
+    previous_forex = benchmark.helpers.forex_to_usd
+    results = benchmark.run_stages(paths, 50, "csv", output_path, trace_memory=True)
+
+    assert tuple(results) == benchmark.STAGES
+    assert all(record["memory_peak_bytes"] >= 0 for record in results.values())
+    assert len(output_path.read_text().splitlines()) == 51
+    assert benchmark.helpers.forex_to_usd is previous_forex